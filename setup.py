@@ -22,5 +22,9 @@ setuptools.setup(
         "requests>=2.21.0",
         "websocket-client>=0.55.0",
         "urllib3==1.25.2"
-    ]
+    ],
+    extras_require={
+        "orjson": ["orjson"],
+        "async": ["websockets>=14"]
+    }
 )
@@ -0,0 +1,123 @@
+import asyncio
+import inspect
+import logging
+
+try:
+    from websockets.asyncio.client import connect
+except ImportError:
+    connect = None
+
+from signalrcore.messages.ping_message import PingMessage
+
+from .errors import HubError
+from .hub_dispatcher import HubDispatcherMixin
+
+_LOGGER = logging.getLogger("SignalRCoreClient")
+
+
+class AsyncHubConnection(HubDispatcherMixin):
+    """
+    asyncio hub connection, same interface as BaseHubConnection
+    but start, stop, send and stream are coroutines.
+    Requires websockets>=14
+    """
+    def __init__(self, url, protocol, headers={}, keep_alive_interval=15):
+        self.logger = _LOGGER
+        self.url = url
+        self.protocol = protocol
+        self._encode = self.protocol.encode
+        self._parse_messages = self.protocol.parse_messages
+        self._encoded_ping = self._encode(PingMessage())
+        self._text = self.protocol.transfer_format == "Text"
+        self.headers = headers
+        self.keep_alive_interval = keep_alive_interval
+        self.handshake_received = False
+        self.connection_alive = False
+        self._init_dispatcher()
+        self._ws = None
+        self._task = None
+        self._keep_alive_task = None
+        self._last_send = 0
+
+    async def start(self):
+        if connect is None:
+            raise HubError("AsyncHubConnection requires websockets>=14")
+        self.handshake_received = False
+        self._ws = await connect(self.url, additional_headers=self.headers)
+        self.logger.info("-- web socket open --")
+        msg = self.protocol.handshake_message()
+        try:
+            await self._ws.send(self._encode(msg), text=self._text)
+            self.evaluate_handshake(await self._ws.recv())
+        except Exception:
+            await self._ws.close()
+            self._ws = None
+            raise
+        loop = asyncio.get_running_loop()
+        self._last_send = loop.time()
+        self._task = asyncio.create_task(self._reader())
+        self._keep_alive_task = asyncio.create_task(self._keep_alive())
+
+    async def stop(self):
+        for task in (self._keep_alive_task, self._task):
+            if task is not None:
+                task.cancel()
+        self._keep_alive_task = None
+        self._task = None
+        if self._ws is not None:
+            await self._ws.close()
+        self.connection_alive = False
+        self.logger.info("-- web socket close --")
+
+    def evaluate_handshake(self, message):
+        self._check_handshake(message)
+        self.handshake_received = True
+        self.connection_alive = True
+
+    async def _reader(self):
+        try:
+            async for raw_message in self._ws:
+                await self.on_message(raw_message)
+        except Exception as ex:
+            self.logger.error("-- web socket error --")
+            self.logger.error("{0} {1}".format(ex, type(ex)))
+        self.connection_alive = False
+
+    async def _keep_alive(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(1)
+            if loop.time() - self._last_send > self.keep_alive_interval:
+                try:
+                    await self._raw_send(self._encoded_ping)
+                except Exception as ex:
+                    self.logger.error("Keep alive failed {0}".format(ex))
+                    self.connection_alive = False
+                    return
+
+    async def on_message(self, raw_message):
+        # parsing is lazy, a bad record must not end the reader task
+        try:
+            for message in self._parse_messages(raw_message):
+                try:
+                    for callback, argument in self._callbacks_for(message):
+                        result = callback(argument)
+                        if inspect.isawaitable(result):
+                            await result
+                except Exception as ex:
+                    self.logger.error(
+                        "Error dispatching message {0}".format(ex))
+        except Exception as ex:
+            self.logger.error("Error parsing message {0}".format(ex))
+
+    async def send(self, message):
+        await self._raw_send(self._encode(message))
+
+    async def _raw_send(self, payload):
+        await self._ws.send(payload, text=self._text)
+        self._last_send = asyncio.get_running_loop().time()
+
+    async def stream(self, event, event_params):
+        stream_obj, message = self._create_stream(event, event_params)
+        await self.send(message)
+        return stream_obj
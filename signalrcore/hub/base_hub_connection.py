@@ -1,71 +1,160 @@
+import collections
 import logging
+import queue
+import select
 import websocket
 import threading
-import uuid
-import time
-
-from signalrcore.messages.message_type import MessageType
-from signalrcore.messages.stream_invocation_message\
-    import StreamInvocationMessage
 
 from signalrcore.messages.ping_message import PingMessage
 
+from .hub_dispatcher import HubDispatcherMixin, StreamHandler
 from .reconnection import ConnectionStateChecker, ExponentialReconnectionHandler, RawReconnectionHandler, ReconnectionType
 
-class StreamHandler(object):
-    def __init__(self, event, invocation_id):
-        self.event = event
-        self.invocation_id = invocation_id
-        self.next_callback = None
-        self.complete_callback = None
-        self.error_callback = None
-
-    def subscribe(self, subscribe_callbacks):
-        if subscribe_callbacks is None:
-            raise ValueError(" subscribe object must be {0}".format({
-                "next": None,
-                "complete": None,
-                "error": None
-                }))
-        self.next_callback = subscribe_callbacks["next"]
-        self.complete_callback = subscribe_callbacks["complete"]
-        self.error_callback = subscribe_callbacks["error"]
-
-
-class BaseHubConnection(websocket.WebSocketApp):
+# bound for both the inbound dispatch queue and the pending sends buffer
+MAX_QUEUED_MESSAGES = 4096
+
+_LOGGER = logging.getLogger("SignalRCoreClient")
+if not _LOGGER.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setLevel(logging.INFO)
+    _LOGGER.addHandler(_handler)
+
+
+class BaseHubConnection(HubDispatcherMixin, websocket.WebSocketApp):
     def __init__(self, url, protocol, headers={}):
-        self.logger = logging.getLogger("SignalRCoreClient")
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.INFO)
-        self.logger.addHandler(ch)
+        self.logger = _LOGGER
         self.url = url
         self.protocol = protocol
+        self._encode = self.protocol.encode
+        self._parse_messages = self.protocol.parse_messages
+        self._encoded_ping = self._encode(PingMessage())
+        self._opcode = websocket.ABNF.OPCODE_TEXT\
+            if self.protocol.transfer_format == "Text"\
+            else websocket.ABNF.OPCODE_BINARY
         self.headers = headers
         self.handshake_received = False
         self.connection_alive = False
-        self.handlers = []
-        self.stream_handlers = []
+        self._init_dispatcher()
         self._thread = None
         self._ws = None
-        self.connection_checker = ConnectionStateChecker(
-            lambda: self.send(PingMessage()),
-            15
-        )
+        self._ws_send = None
+        self._stop_event = threading.Event()
+        self.read_timeout = 1
+        self.read_completion = None
+        self.connection_checker = self._create_connection_checker(15)
         self.reconnection_handler = None
+        self._reconnect_event = threading.Event()
+        self._reconnect_thread = None
+        self._handshake_event = threading.Event()
+        self._pending_sends = collections.deque(maxlen=MAX_QUEUED_MESSAGES)
+        self.batching_enabled = False
+        self._batch_max_bytes = 25 * 1024
+        self._batch_max_delay = 0.002
+        self._send_queue = collections.deque()
+        self._send_lock = threading.Lock()
+        # held from taking a batch until it is written, keeps batches ordered
+        self._write_lock = threading.RLock()
+        self._send_bytes = 0
+        self._flush_timer = None
+        self.drop_on_overflow = False
+        self._dispatch_queue = queue.Queue(maxsize=MAX_QUEUED_MESSAGES)
+        self._dispatcher = None
+        self._dispatcher_stop = threading.Event()
+
+    def _create_connection_checker(self, keep_alive_interval):
+        return ConnectionStateChecker(
+            self._send_ping,
+            keep_alive_interval
+        )
 
     def start(self):
-        self._ws = websocket.WebSocketApp(
-            self.url,
-            header=self.headers,
-            on_message=self.on_message,
-            on_error=self.on_error,
-            on_close=self.on_close,
-            on_open=self.on_open,
-            )
-        self._thread = threading.Thread(target=self._ws.run_forever)
+        self.handshake_received = False
+        self._handshake_event.clear()
+        self._ws = websocket.WebSocket()
+        self._ws_send = self._ws.send
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(self._ws, self._stop_event))
         self._thread.daemon = True
         self._thread.start()
+        if self._dispatcher is None:
+            # a fresh queue per dispatcher, a stopped one drains its own
+            self._dispatch_queue = queue.Queue(maxsize=MAX_QUEUED_MESSAGES)
+            self._dispatcher_stop = threading.Event()
+            self._dispatcher = threading.Thread(
+                target=self._dispatch_loop,
+                args=(self._dispatch_queue, self._dispatcher_stop))
+            self._dispatcher.daemon = True
+            self._dispatcher.start()
+        if self.connection_checker.ident is not None:
+            # threads can only be started once, build a new checker
+            self.connection_checker = self._create_connection_checker(
+                self.connection_checker.keep_alive_interval)
         self.connection_checker.start()
+        if self.reconnection_handler is not None:
+            self._start_reconnect_thread()
+
+    def _run(self, ws, stop_event):
+        try:
+            ws.connect(self.url, header=self.headers)
+        except Exception as ex:
+            self.on_error(ex)
+            return
+        if stop_event.is_set():
+            # superseded by a newer start while connecting
+            ws.shutdown()
+            return
+        self.on_open()
+        try:
+            while not stop_event.is_set() and ws.connected:
+                if not self._readable(ws, self.read_timeout):
+                    continue
+                batch = []
+                closed = False
+                # drain every frame already available before dispatching
+                while True:
+                    opcode, data = ws.recv_data()
+                    if opcode == websocket.ABNF.OPCODE_CLOSE:
+                        closed = True
+                        break
+                    if opcode == websocket.ABNF.OPCODE_TEXT:
+                        data = data.decode("utf-8")
+                    batch.append(data)
+                    if not self._readable(ws, 0):
+                        break
+                self._on_batch(batch)
+                if closed:
+                    break
+        except Exception as ex:
+            if not stop_event.is_set():
+                self.on_error(ex)
+        finally:
+            ws.shutdown()
+            if ws is self._ws:
+                self.connection_alive = False
+            self.on_close()
+
+    @staticmethod
+    def _readable(ws, timeout):
+        sock = ws.sock
+        if sock is None:
+            return False
+        # ssl sockets may hold decrypted data that select can't see
+        pending = getattr(sock, "pending", None)
+        if pending is not None and pending() > 0:
+            return True
+        readable, _, _ = select.select([sock], [], [], timeout)
+        return len(readable) > 0
+
+    def _on_batch(self, batch):
+        if self.read_completion is not None and self.handshake_received:
+            batch = self.read_completion(batch)
+        for raw_message in batch:
+            try:
+                self.on_message(raw_message)
+            except Exception as ex:
+                self.on_error(ex)
 
     def configure_reconnection(
             self,
@@ -79,40 +168,116 @@ class BaseHubConnection(websocket.WebSocketApp):
         reconn_type = ReconnectionType[reconnection_type]
         
         if reconn_type == ReconnectionType.raw:
-            self.reconnection_handler = ReconnectionHandler(
+            self.reconnection_handler = RawReconnectionHandler(
                 sleep_time = reconnect_interval,
                 max_attemps = max_attemps
             )
         if reconn_type == ReconnectionType.exponential:
-            self.reconnection_handler = ReconnectionHandler(
+            self.reconnection_handler = ExponentialReconnectionHandler(
                 sleep_time = reconnect_interval,
                 max_attemps = max_attemps
             )
-        
 
+        if self._ws is not None:
+            self._start_reconnect_thread()
+
+    def _start_reconnect_thread(self):
+        if self._reconnect_thread is not None:
+            return
+        # one event per thread, stop() uses it to retire the thread
+        self._reconnect_event = threading.Event()
+        self._reconnect_thread = threading.Thread(
+            target=self._reconnect_loop,
+            args=(self._reconnect_event,))
+        self._reconnect_thread.daemon = True
+        self._reconnect_thread.start()
+
+    def _reconnect_loop(self, reconnect_event):
+        current = threading.current_thread()
+        while True:
+            reconnect_event.wait()
+            reconnect_event.clear()
+            attempt = 0
+            while self._reconnect_thread is current:
+                attempt += 1
+                try:
+                    self._disconnect()
+                    self.start()
+                except Exception as ex:
+                    self.logger.error("Reconnection failed {0}".format(ex))
+                handler = self.reconnection_handler
+                if self._handshake_event.wait(
+                        handler.next_sleep_time(attempt)):
+                    break
+                if handler.max_attemps is not None \
+                        and attempt >= handler.max_attemps:
+                    self.logger.error(
+                        "Reconnection failed after {0} attempts,"
+                        " {1} messages pending".format(
+                            attempt, len(self._pending_sends)))
+                    # next failed send starts over
+                    handler.reconnecting = False
+                    break
+            if self._reconnect_thread is not current:
+                return
+
+    def configure_batching(
+            self,
+            max_bytes=25 * 1024,
+            max_delay=0.002):
+        self.batching_enabled = True
+        self._batch_max_bytes = max_bytes
+        self._batch_max_delay = max_delay
 
     def stop(self):
+        self._disconnect()
+        if self._dispatcher is not None:
+            try:
+                # wakes the dispatcher once queued messages are handled
+                self._dispatch_queue.put_nowait(None)
+            except queue.Full:
+                if threading.current_thread() is self._dispatcher:
+                    # called from a handler, blocking here would deadlock
+                    self._dispatcher_stop.set()
+                else:
+                    self._dispatch_queue.put(None)
+            self._dispatcher = None
+        if self._reconnect_thread is not None:
+            self._reconnect_thread = None
+            self._reconnect_event.set()
+        if self.reconnection_handler is not None:
+            # a later start() must be able to reconnect again
+            self.reconnection_handler.reconnecting = False
+
+    def _disconnect(self):
+        try:
+            self._flush()
+        except Exception as ex:
+            # the connection is going away, don't let it abort stop()
+            self.logger.error("Error flushing pending messages {0}".format(ex))
+        self._stop_event.set()
         if self.connection_alive:
-            self.close()
+            try:
+                self._ws.send_close()
+            except (websocket.WebSocketException, OSError) as ex:
+                self.logger.error("Error closing connection {0}".format(ex))
         self.connection_checker.stop()
 
-    def register_handler(self, event, callback):
-        self.handlers.append((event, callback))
-
     def evaluate_handshake(self, message):
-        msg = self.protocol.decode_handshake(message)
-        if msg.error is None or msg.error == "":
+        self._check_handshake(message)
+        with self._write_lock:
             self.handshake_received = True
             self.connection_alive = True
-            self.reconnection_handler.reconnecting = False
-        else:
-            self.logger.error(msg.error)
-            raise ValueError("Handshake error {0}".format(msg.error))
+            if self.reconnection_handler is not None:
+                self.reconnection_handler.reconnecting = False
+            self._handshake_event.set()
+            self._replay_pending()
 
     def on_open(self):
         self.logger.info("-- web socket open --")
         msg = self.protocol.handshake_message()
-        self.send(msg)
+        # handshake must be the first record, bypass the batching queue
+        self._ws_send(self._encode(msg), self._opcode)
 
     def on_close(self):
         self.logger.info("-- web socket close --")
@@ -122,112 +287,146 @@ class BaseHubConnection(websocket.WebSocketApp):
         self.logger.error("{0} {1}".format(error, type(error)))
 
     def on_message(self, raw_message):
-        self.connection_checker.last_message = time.time()
+        self.connection_checker.got_message = True
         if not self.handshake_received:
             self.evaluate_handshake(raw_message)
             return
 
-        messages = self.protocol.parse_messages(raw_message)
+        messages = self._parse_messages(raw_message)
         for message in messages:
-            if message.type == MessageType.invocation_binding_failure:
-                logging.error(message)
-                continue
-            if message.type == MessageType.ping:
-                continue
-
-            if message.type == MessageType.invocation:
-                fired_handlers = list(
-                    filter(
-                        lambda h: h[0] == message.target,
-                        self.handlers))
-                if len(fired_handlers) == 0:
-                    logging.warn(
-                        "event '{0}' hasn't fire any handler".format(
-                            message.target))
-                for _, handler in fired_handlers:
-                    handler(message.arguments)
-
-            if message.type == MessageType.close:
-                logging.info("Close message received from server")
-                self.connection_alive = False
+            if self.drop_on_overflow:
+                try:
+                    self._dispatch_queue.put_nowait(message)
+                except queue.Full:
+                    self.logger.warning(
+                        "dispatch queue full, dropping {0}".format(
+                            message.type))
+            else:
+                self._dispatch_queue.put(message)
+
+    def _dispatch_loop(self, dispatch_queue, stop_event):
+        while not stop_event.is_set():
+            message = dispatch_queue.get()
+            if message is None:
                 return
+            try:
+                self._dispatch(message)
+            except Exception as ex:
+                self.logger.error(
+                    "Error dispatching message {0}".format(ex))
 
-            if message.type == MessageType.completion:
-                fired_handlers = list(
-                    filter(
-                        lambda h: h.invocation_id == message.invocation_id,
-                        self.stream_handlers))
-                for handler in fired_handlers:
-                    handler.complete_callback(message)
-
-                # unregister handler
-                self.stream_handlers = list(
-                    filter(
-                        lambda h: h.invocation_id != message.invocation_id,
-                        self.stream_handlers))
-
-            if message.type == MessageType.stream_item:
-                fired_handlers = list(
-                    filter(
-                        lambda h: h.invocation_id == message.invocation_id,
-                        self.stream_handlers))
-                if len(fired_handlers) == 0:
-                    logging.warn(
-                        "id '{0}' hasn't fire any stream handler".format(
-                            message.invocation_id))
-                for handler in fired_handlers:
-                    handler.next_callback(message.item)
-
-            if message.type == MessageType.stream_invocation:
-                pass
-
-            if message.type == MessageType.cancel_invocation:
-                fired_handlers = list(
-                    filter(
-                        lambda h: h.invocation_id == message.invocation_id,
-                        self.stream_handlers))
-                if len(fired_handlers) == 0:
-                    logging.warn(
-                        "id '{0}' hasn't fire any stream handler".format(
-                            message.invocation_id))
-
-                for handler in fired_handlers:
-                    handler.error_callback(message)
-
-                # unregister handler
-                self.stream_handlers = list(
-                    filter(
-                        lambda h: h.invocation_id != message.invocation_id,
-                        self.stream_handlers))
+    def _dispatch(self, message):
+        for callback, argument in self._callbacks_for(message):
+            callback(argument)
 
     def send(self, message):
-        try:
-            self._ws.send(self.protocol.encode(message))
-            self.connection_checker.last_message = time.time()
-        except (
-                websocket._exceptions.WebSocketConnectionClosedException,
-                ConnectionResetError) as ex:
-            if self.reconnection_handler is None:
-                raise ex
-            # Connection closed
-            self.logger.error("Connection closed {0}".format(ex))
-            self.connection_alive = False
-            if not self.reconnection_handler.reconnecting:
-                self.reconnection_handler.reconnecting = True
-                self.stop()
-                self.start()
+        payload = self._encode(message)
+        if not self.batching_enabled:
+            self._raw_send(payload)
+            return
 
+        with self._send_lock:
+            self._send_queue.append(payload)
+            self._send_bytes += len(payload)
+            flush_now = self._send_bytes >= self._batch_max_bytes
+            if not flush_now and self._flush_timer is None:
+                self._flush_timer = threading.Timer(
+                    self._batch_max_delay,
+                    self._timer_flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if flush_now:
+            self._flush()
+
+    def _timer_flush(self):
+        # nobody waits on the timer thread, report errors instead of raising
+        try:
+            self._flush()
         except Exception as ex:
-            raise ex
+            self.on_error(ex)
+
+    def _flush(self):
+        with self._write_lock:
+            with self._send_lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if len(self._send_queue) == 0:
+                    return
+                # every record ends with the record separator,
+                # so several of them fit in a single frame
+                payload = b"".join(self._send_queue)
+                self._send_queue.clear()
+                self._send_bytes = 0
+            self._raw_send(payload)
+
+    def _raw_send(self, payload, buffer=True):
+        with self._write_lock:
+            if not self.handshake_received:
+                connecting = self._thread is not None \
+                    and self._thread.is_alive()
+                if not buffer:
+                    return False
+                if self.reconnection_handler is None and not connecting:
+                    # nothing would ever replay it
+                    raise websocket.WebSocketConnectionClosedException(
+                        "Connection is not open")
+                # the handshake has to be the first record on the socket
+                self._buffer_send(payload)
+                if self.reconnection_handler is not None \
+                        and self._thread is not None and not connecting:
+                    # last connection attempt is over, try again
+                    self._request_reconnect()
+                return False
+            try:
+                self._ws_send(payload, self._opcode)
+                self.connection_checker.got_message = True
+                return True
+            except (
+                    websocket._exceptions.WebSocketConnectionClosedException,
+                    ConnectionResetError) as ex:
+                if self.reconnection_handler is None:
+                    raise
+                # Connection closed
+                self.logger.error("Connection closed {0}".format(ex))
+                self.connection_alive = False
+                if buffer:
+                    self._buffer_send(payload)
+                self._request_reconnect()
+                return False
+
+    def _request_reconnect(self):
+        if not self.reconnection_handler.reconnecting:
+            self.reconnection_handler.reconnecting = True
+            self._reconnect_event.set()
+
+    def _buffer_send(self, payload):
+        if len(self._pending_sends) == self._pending_sends.maxlen:
+            self.logger.warning(
+                "{0} messages pending, dropping the oldest one".format(
+                    self._pending_sends.maxlen))
+        self._pending_sends.append(payload)
+
+    def _replay_pending(self):
+        # snapshot, a failed send puts its payload back on the deque
+        pending = [
+            self._pending_sends.popleft()
+            for _ in range(len(self._pending_sends))]
+        for index, payload in enumerate(pending):
+            try:
+                sent = self._raw_send(payload)
+            except Exception:
+                self._pending_sends.extend(pending[index:])
+                raise
+            if not sent:
+                self._pending_sends.extend(pending[index + 1:])
+                return
+
+    def _send_ping(self):
+        # pre-encoded, skips the encoder and the batching queue
+        self._raw_send(self._encoded_ping, buffer=False)
 
     def stream(self, event, event_params):
-        invocation_id = str(uuid.uuid4())
-        stream_obj = StreamHandler(event, invocation_id)
-        self.stream_handlers.append(stream_obj)
-        self.send(
-            StreamInvocationMessage(
-                {},
-                invocation_id,
-                event,
-                event_params))
+        stream_obj, message = self._create_stream(event, event_params)
+        self.send(message)
         return stream_obj
@@ -0,0 +1,127 @@
+import itertools
+import logging
+
+from signalrcore.messages.message_type import MessageType
+from signalrcore.messages.stream_invocation_message\
+    import StreamInvocationMessage
+
+
+class StreamHandler(object):
+    __slots__ = (
+        "event",
+        "invocation_id",
+        "next_callback",
+        "complete_callback",
+        "error_callback")
+
+    def __init__(self, event, invocation_id):
+        self.event = event
+        self.invocation_id = invocation_id
+        self.next_callback = None
+        self.complete_callback = None
+        self.error_callback = None
+
+    def subscribe(self, subscribe_callbacks):
+        if subscribe_callbacks is None:
+            raise ValueError(" subscribe object must be {0}".format({
+                "next": None,
+                "complete": None,
+                "error": None
+                }))
+        self.next_callback = subscribe_callbacks["next"]
+        self.complete_callback = subscribe_callbacks["complete"]
+        self.error_callback = subscribe_callbacks["error"]
+
+
+class HubDispatcherMixin(object):
+    """
+    Handler registry and message routing shared by the sync and
+    asyncio connections. Routing only returns (callback, argument)
+    pairs, each connection decides how to call them.
+    """
+    def _init_dispatcher(self):
+        self.handlers = {}
+        self.stream_handlers = {}
+        self._invocation_counter = itertools.count(1)
+        self._type_dispatch = {
+            MessageType.invocation: self._handle_invocation,
+            MessageType.completion: self._handle_completion,
+            MessageType.stream_item: self._handle_stream_item,
+            MessageType.cancel_invocation: self._handle_cancel,
+            MessageType.close: self._handle_close,
+            MessageType.invocation_binding_failure:
+                self._handle_binding_failure,
+            MessageType.ping: None,
+            MessageType.stream_invocation: None
+        }
+
+    def register_handler(self, event, callback):
+        self.handlers.setdefault(event, []).append(callback)
+
+    def _check_handshake(self, message):
+        msg = self.protocol.decode_handshake(message)
+        if msg.error is not None and msg.error != "":
+            self.logger.error(msg.error)
+            raise ValueError("Handshake error {0}".format(msg.error))
+
+    def _create_stream(self, event, event_params):
+        invocation_id = str(next(self._invocation_counter))
+        stream_obj = StreamHandler(event, invocation_id)
+        self.stream_handlers[invocation_id] = stream_obj
+        return stream_obj, StreamInvocationMessage(
+            {},
+            invocation_id,
+            event,
+            event_params)
+
+    def _callbacks_for(self, message):
+        handler = self._type_dispatch.get(message.type)
+        if handler is None:
+            return ()
+        return handler(message)
+
+    def _handle_binding_failure(self, message):
+        self.logger.error(message)
+        return ()
+
+    def _handle_invocation(self, message):
+        fired_handlers = self.handlers.get(message.target, ())
+        if len(fired_handlers) == 0 \
+                and self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(
+                "event '{0}' hasn't fire any handler".format(
+                    message.target))
+        return [(handler, message.arguments) for handler in fired_handlers]
+
+    def _handle_close(self, message):
+        self.logger.info("Close message received from server")
+        self.connection_alive = False
+        return ()
+
+    def _handle_completion(self, message):
+        # unregister handler
+        handler = self.stream_handlers.pop(message.invocation_id, None)
+        if handler is None:
+            return ()
+        return [(handler.complete_callback, message)]
+
+    def _handle_stream_item(self, message):
+        handler = self.stream_handlers.get(message.invocation_id)
+        if handler is None:
+            if self.logger.isEnabledFor(logging.WARNING):
+                self.logger.warning(
+                    "id '{0}' hasn't fire any stream handler".format(
+                        message.invocation_id))
+            return ()
+        return [(handler.next_callback, message.item)]
+
+    def _handle_cancel(self, message):
+        # unregister handler
+        handler = self.stream_handlers.pop(message.invocation_id, None)
+        if handler is None:
+            if self.logger.isEnabledFor(logging.WARNING):
+                self.logger.warning(
+                    "id '{0}' hasn't fire any stream handler".format(
+                        message.invocation_id))
+            return ()
+        return [(handler.error_callback, message)]
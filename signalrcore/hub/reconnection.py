@@ -12,17 +12,25 @@ class ConnectionStateChecker(threading.Thread):
         threading.Thread.__init__(self)
         self.sleep = sleep
         self.keep_alive_interval = keep_alive_interval
-        self.last_message = time.time()
+        self.last_message = time.monotonic()
+        self.got_message = False
         self.ping_function = ping_function
         self.running = True
 
     def run(self):
         while self.running:
             time.sleep(self.sleep)
-            time_without_messages = time.time() - self.last_message
+            now = time.monotonic()
+            if self.got_message:
+                self.got_message = False
+                self.last_message = now
+            time_without_messages = now - self.last_message
             if self.keep_alive_interval < time_without_messages:
                 self.ping_function()
 
+    def stop(self):
+        self.running = False
+
 
 class ReconnectionType(Enum):
     raw=0
@@ -38,8 +46,12 @@ class ReconnectionHandler(object):
         self.max_attemps = max_attemps
         self.sleep_time = sleep_time
 
+    def next_sleep_time(self, attempt):
+        return self.sleep_time
+
 class RawReconnectionHandler(ReconnectionHandler):
   pass
 
 class ExponentialReconnectionHandler(ReconnectionHandler):
-  pass
+    def next_sleep_time(self, attempt):
+        return self.sleep_time * 2 ** (attempt - 1)
@@ -1,7 +1,6 @@
-import uuid
-
 from .hub.base_hub_connection import BaseHubConnection
 from .hub.auth_hub_connection import AuthHubConnection
+from .hub.async_hub_connection import AsyncHubConnection
 from .messages.invocation_message import InvocationMessage
 from .protocol.json_hub_protocol import JsonHubProtocol
 
@@ -36,39 +35,48 @@ class HubConnectionBuilder(object):
             self,
             hub_url,
             options=None):
-        if hub_url is None or hub_url.strip() is "":
+        if hub_url is None or hub_url.strip() == "":
             raise HubConnectionError("hub_url must be a valid url.")
 
         if options is not None and type(options) != dict:
             raise HubConnectionError(
                 "options must be a dict {0}.".format(self.options))
 
+        factory = options.get("access_token_factory") \
+            if options is not None else None
+
         if options is not None \
-                and "access_token_factory" in options.keys()\
-                and not callable(options["access_token_factory"]):
+                and "access_token_factory" in options \
+                and not callable(factory):
             raise HubConnectionError(
                 "access_token_factory must be a function without params")
 
         if options is not None:
-
-            self.has_auth_configured = \
-                "access_token_factory" in options.keys()\
-                and callable(options["access_token_factory"])
+            self.has_auth_configured = callable(factory)
         self.hub_url = hub_url
         self._hub = None
         self.options = self.options if options is None else options
         return self
 
-    def build(self):
+    def build(self, async_mode=False):
         """"
         self.token = token
         self.headers = headers
         self.negotiate_headers = negotiate_headers
         self.has_auth_configured = token is not None
 
+        async_mode: build an asyncio connection, start, stop, send
+            and stream must be awaited
+
         """
         self.protocol = JsonHubProtocol()
         self.headers = {}
+        if async_mode:
+            if self.has_auth_configured:
+                raise HubConnectionError(
+                    "access_token_factory is not supported in async mode")
+            self._hub = AsyncHubConnection(self.hub_url, self.protocol)
+            return self
         if self.has_auth_configured:
             auth_function = self.options["access_token_factory"]
             if auth_function is None or not callable(auth_function):
@@ -86,15 +94,17 @@ class HubConnectionBuilder(object):
         return self
 
     def on_disconnect(self, data):
-        reconnect_type = data["type"] if "type" in data.keys() else "raw"
-        
-        max_attemps = data["max_attemps"] if "max_attemps" in data.keys() else None # Infinite reconnect
-        
-        reconnect_interval = data["reconnect_interval"]\
-            if "reconnect_interval" in data.keys() else 5 # 5 sec interval
-        
-        keep_alive_interval =data["keep_alive_interval"]\
-            if "keep_alive_interval" in data.keys() else 15
+        if isinstance(self._hub, AsyncHubConnection):
+            raise HubConnectionError(
+                "reconnection is not supported in async mode")
+
+        reconnect_type = data.get("type", "raw")
+
+        max_attemps = data.get("max_attemps")  # Infinite reconnect
+
+        reconnect_interval = data.get("reconnect_interval", 5)  # 5 sec interval
+
+        keep_alive_interval = data.get("keep_alive_interval", 15)
 
         self._hub.configure_reconnection(
             reconnect_type,
@@ -103,6 +113,22 @@ class HubConnectionBuilder(object):
             max_attemps=max_attemps
         )
 
+    def with_batching(self, data=None):
+        """
+        Coalesce outgoing messages into a single websocket frame
+        :param data: dict with optional max_bytes and max_delay (seconds)
+        :return:
+        """
+        if isinstance(self._hub, AsyncHubConnection):
+            raise HubConnectionError(
+                "batching is not supported in async mode")
+        data = {} if data is None else data
+        self._hub.configure_batching(
+            max_bytes=data.get("max_bytes", 25 * 1024),
+            max_delay=data.get("max_delay", 0.002)
+        )
+        return self
+
     def on(self, event, callback_function):
         """
         Register a callback on the specified event
@@ -116,16 +142,16 @@ class HubConnectionBuilder(object):
         return self._hub.stream(event, event_params)
 
     def start(self):
-        self._hub.start()
+        return self._hub.start()
 
     def stop(self):
-        self._hub.stop()
+        return self._hub.stop()
 
     def send(self, method, arguments):
         if type(arguments) is not list:
             raise HubConnectionError("Arguments of a message must be a list")
-        self._hub.send(InvocationMessage(
+        return self._hub.send(InvocationMessage(
             {},
-            str(uuid.uuid4()),
+            str(next(self._hub._invocation_counter)),
             method,
             arguments))
@@ -1,4 +1,10 @@
 import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from .base_hub_protocol import BaseHubProtocol
 
 from ..messages.message_type import MessageType
@@ -101,18 +107,48 @@ class JsonHubProtocol(BaseHubProtocol):
     def __init__(self):
         super(JsonHubProtocol, self).__init__("json", 1, "Text", chr(0x1E))
         self.encoder = MyEncoder()
+        self.encoded_record_separator = self.record_separator.encode("utf-8")
+        self._loads = json.loads if orjson is None else self._orjson_loads
+
+    @staticmethod
+    def _orjson_loads(raw):
+        # integers over 64 bits are still decoded as floats by orjson
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # NaN, lone surrogates... json accepts them
+            return json.loads(raw)
 
     def parse_messages(self, raw):
-        raw_messages = [
-            record.replace(self.record_separator, "")
-            for record in raw.split(self.record_separator)
-            if record is not None and record is not "" and record is not self.record_separator
-            ]
-        result = []
-        for raw_message in raw_messages:
-            dict_message = json.loads(raw_message)
-            result.append(self.get_message(dict_message))
-        return result
+        separator = self.encoded_record_separator\
+            if isinstance(raw, bytes) else self.record_separator
+        # common case, a single record ended by the separator
+        if raw.find(separator) == len(raw) - 1 and len(raw) > 1:
+            return [self.get_message(self._loads(raw[:-1]))]
+        return self._iter_messages(raw, separator)
+
+    def _iter_messages(self, raw, separator):
+        start = 0
+        end = raw.find(separator, start)
+        while end >= 0:
+            if end > start:
+                yield self.get_message(self._loads(raw[start:end]))
+            start = end + 1
+            end = raw.find(separator, start)
+        # tolerate a last record without separator
+        if start < len(raw):
+            yield self.get_message(self._loads(raw[start:]))
 
     def encode(self, message):
-        return self.encoder.encode(message) + self.record_separator
+        if orjson is not None:
+            try:
+                return orjson.dumps(
+                    message,
+                    default=self.encoder.default,
+                    option=orjson.OPT_NON_STR_KEYS)\
+                    + self.encoded_record_separator
+            except TypeError:
+                # e.g. integers over 64 bits, json handles those
+                pass
+        return (self.encoder.encode(message) + self.record_separator)\
+            .encode("utf-8")
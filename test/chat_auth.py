@@ -30,6 +30,6 @@ hub_connection.start()
 message = None
 while message != "exit()":
     message = input(">> ")
-    if message is not None and message is not "" and message is not "exit()":
+    if message and message != "exit()":
         hub_connection.send("Send", [message])
 hub_connection.stop()
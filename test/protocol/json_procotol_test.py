@@ -0,0 +1,106 @@
+import json
+import unittest
+from unittest import mock
+
+from signalrcore.protocol import json_hub_protocol
+from signalrcore.protocol.json_hub_protocol import JsonHubProtocol
+from signalrcore.messages.message_type import MessageType
+from signalrcore.messages.invocation_message import InvocationMessage
+from signalrcore.messages.ping_message import PingMessage
+
+SEPARATOR = chr(0x1E)
+
+
+def record(target, *arguments):
+    return json.dumps({
+        "type": 1,
+        "target": target,
+        "arguments": list(arguments)}) + SEPARATOR
+
+
+class JsonProtocolTest(unittest.TestCase):
+    orjson = None
+
+    def setUp(self):
+        patcher = mock.patch.object(json_hub_protocol, "orjson", self.orjson)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.protocol = JsonHubProtocol()
+
+    def parse(self, raw):
+        return list(self.protocol.parse_messages(raw))
+
+    def test_single_record(self):
+        messages = self.parse(record("Send", 42, "Test Message"))
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].type, MessageType.invocation)
+        self.assertEqual(messages[0].target, "Send")
+        self.assertEqual(messages[0].arguments, [42, "Test Message"])
+
+    def test_several_records(self):
+        raw = record("a", 1) + record("b", 2) + record("c", 3)
+        messages = self.parse(raw)
+        self.assertEqual([m.target for m in messages], ["a", "b", "c"])
+        self.assertEqual([m.arguments for m in messages], [[1], [2], [3]])
+
+    def test_trailing_record_without_separator(self):
+        raw = record("a", 1) + record("b", 2)[:-1]
+        messages = self.parse(raw)
+        self.assertEqual([m.target for m in messages], ["a", "b"])
+
+    def test_empty_frame(self):
+        self.assertEqual(self.parse(""), [])
+        self.assertEqual(self.parse(b""), [])
+
+    def test_separator_only_frame(self):
+        self.assertEqual(self.parse(SEPARATOR), [])
+        self.assertEqual(self.parse(SEPARATOR * 3), [])
+        self.assertEqual(self.parse(SEPARATOR.encode("utf-8")), [])
+
+    def test_bytes_input(self):
+        raw = (record("a", "á") + record("b", 2)).encode("utf-8")
+        messages = self.parse(raw)
+        self.assertEqual([m.target for m in messages], ["a", "b"])
+        self.assertEqual(messages[0].arguments, ["á"])
+        messages = self.parse(record("c", 3).encode("utf-8"))
+        self.assertEqual([m.target for m in messages], ["c"])
+
+    def test_encode(self):
+        message = InvocationMessage({}, "1", "Send", [42, "Test Message"])
+        encoded = self.protocol.encode(message)
+        self.assertIsInstance(encoded, bytes)
+        self.assertTrue(encoded.endswith(b"\x1e"))
+        self.assertEqual(encoded.count(b"\x1e"), 1)
+        decoded = self.parse(encoded)[0]
+        self.assertEqual(decoded.type, MessageType.invocation)
+        self.assertEqual(decoded.invocation_id, "1")
+        self.assertEqual(decoded.target, "Send")
+        self.assertEqual(decoded.arguments, [42, "Test Message"])
+
+    def test_encode_ping(self):
+        encoded = self.protocol.encode(PingMessage())
+        self.assertTrue(encoded.endswith(b"\x1e"))
+        self.assertEqual(json.loads(encoded[:-1]), {"type": 6})
+
+    def test_encode_big_integer(self):
+        message = InvocationMessage({}, "1", "Send", [2 ** 70])
+        encoded = self.protocol.encode(message)
+        self.assertTrue(encoded.endswith(b"\x1e"))
+        self.assertEqual(json.loads(encoded[:-1])["arguments"], [2 ** 70])
+
+    def test_decode_nan(self):
+        messages = self.parse('{"type": 1, "target": "a", '
+                              '"arguments": [NaN]}' + SEPARATOR)
+        self.assertNotEqual(messages[0].arguments[0],
+                            messages[0].arguments[0])
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@unittest.skipIf(orjson is None, "orjson is not installed")
+class OrjsonProtocolTest(JsonProtocolTest):
+    orjson = orjson